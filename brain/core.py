@@ -0,0 +1,442 @@
+# brain/core.py
+# Shared Second Brain logic: the Streamlit app and the eval runner both import this,
+# so the embedding model, FAISS store and LLM client exist once per process.
+import os
+
+# Thread policy must be set before torch / faiss / sentence_transformers load
+# their OpenMP runtimes: sleep idle OMP threads instead of busy-waiting, and split
+# the cores between the embedding model and FAISS rather than oversubscribing.
+# Import this module before anything that pulls those libraries in.
+_OMP_THREADS = str(max(1, (os.cpu_count() or 2) // 2))
+os.environ.setdefault("OMP_WAIT_POLICY", "PASSIVE")
+os.environ.setdefault("OMP_NUM_THREADS", _OMP_THREADS)
+os.environ.setdefault("MKL_NUM_THREADS", _OMP_THREADS)
+
+import asyncio
+import atexit
+import hashlib
+import threading
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from typing import List
+import httpx
+from openai import DefaultHttpxClient, OpenAI
+import re
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from lxml import html as lxml_html
+from rag_pipeline.vector_store import FaissVectorStore
+from rag_pipeline.semantic_cache import SemanticCache
+
+# =====================================================
+# Persistent Files
+# =====================================================
+HISTORY_FILE = "chat_history.jsonl"
+INGESTED_FILES_DB = "ingested_files.json"
+
+# ---------------------
+# Chat history (append-only JSONL, one turn per line)
+# ---------------------
+def load_history(limit: int | None = None) -> List[dict]:
+    if not os.path.exists(HISTORY_FILE):
+        return []
+    # deque keeps only the last `limit` turns instead of the whole file
+    history = deque(maxlen=limit)
+    with open(HISTORY_FILE, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                history.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                # Skip a torn line from an interrupted write
+                continue
+    return list(history)
+
+def append_history(entry: dict):
+    safe_entry = {
+        "user": redact_pii(entry["user"]),
+        "bot": redact_pii(entry["bot"])
+    }
+    with open(HISTORY_FILE, "ab") as f:
+        f.write(orjson.dumps(safe_entry) + b"\n")
+
+
+def clear_history():
+    if os.path.exists(HISTORY_FILE):
+        os.remove(HISTORY_FILE)
+
+# ---------------------
+# Ingested files registry
+# ---------------------
+def load_ingested_files() -> set:
+    if os.path.exists(INGESTED_FILES_DB):
+        try:
+            with open(INGESTED_FILES_DB, "rb") as f:
+                data = orjson.loads(f.read())
+                return set(data)
+        except orjson.JSONDecodeError:
+            # Reset empty or invalid JSON
+            with open(INGESTED_FILES_DB, "wb") as f:
+                f.write(orjson.dumps([]))
+            return set()
+    return set()
+
+def save_ingested_files(files: set):
+    with open(INGESTED_FILES_DB, "wb") as f:
+        f.write(orjson.dumps(list(files), option=orjson.OPT_INDENT_2))
+
+# =====================================================
+# Shared resources (one per process)
+# =====================================================
+# lru_cache: the env lookup and client setup run once, and every LLM call
+# shares its httpx keep-alive pool. A failed lookup raises and isn't cached.
+@lru_cache(maxsize=1)
+def get_client() -> OpenAI:
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY environment variable not set!")
+    return OpenAI(
+        api_key=api_key,
+        base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
+        # HTTP/2 multiplexes concurrent calls (parallel evals, web + doc legs) over a
+        # few warm TLS connections instead of a handshake per burst
+        http_client=DefaultHttpxClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        ),
+    )
+
+@lru_cache(maxsize=None)  # one store per (persist_dir, read_only); never silently rebuilt
+def get_store(persist_dir: str = "faiss_store", read_only: bool = False) -> FaissVectorStore:
+    # Shared by every session, so concurrent questions are coalesced into one FAISS search.
+    # read_only stores (evals) are prewarmed and never learn new memories.
+    store = FaissVectorStore(persist_dir=persist_dir, coalesce_queries=True,
+                             embedding_cache_dir=".cache/embeddings")
+    if os.path.exists(os.path.join(persist_dir, "faiss.index")):
+        store.load(read_only=read_only, prewarm=read_only)
+    # Persist any buffered memories on shutdown
+    atexit.register(store.flush)
+    return store
+
+@lru_cache(maxsize=None)
+def get_semantic_cache(store: FaissVectorStore, persist_dir: str = "semantic_cache") -> SemanticCache:
+    # The caller's store, not a default one: its encoder embeds the cache lookup, and that
+    # embedding is reused by the retrieval
+    cache = SemanticCache(store.encoder, persist_dir=persist_dir)
+    cache.load()
+    atexit.register(cache.save)
+    return cache
+
+# =====================================================
+# Web Search (best effort)
+# =====================================================
+WEB_RESULT_SNIPPETS = 30
+
+# One pooled session keeps the TLS connection to DuckDuckGo alive between searches
+WEB_SESSION = requests.Session()
+WEB_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+def web_search(query: str) -> str:
+    url = "https://duckduckgo.com/html/"
+    headers = {"User-Agent": "Mozilla/5.0", "Accept-Encoding": "gzip, deflate"}
+    params = {"q": query}
+    try:
+        r = WEB_SESSION.post(url, data=params, headers=headers, timeout=10)
+        # Pull only the result snippets out of the page instead of every long line
+        tree = lxml_html.fromstring(r.content)
+        nodes = tree.xpath('//a[contains(@class, "result__snippet")]')
+    except Exception:
+        return ""
+    snippets = (node.text_content().strip() for node in nodes)
+    return "\n".join(islice((s for s in snippets if s), WEB_RESULT_SNIPPETS))
+
+# Signs that we scraped the search page chrome rather than results; one case-insensitive scan
+WEB_NOISE_PATTERN = re.compile(r"<html|<form|duckduckgo|search input|homepage", re.IGNORECASE)
+
+def is_web_data_useless(text: str) -> bool:
+    return not text or WEB_NOISE_PATTERN.search(text) is not None
+
+# Singleflight: identical prompts in flight at the same time (from any session or
+# eval case) share one LLM call. concurrent.futures so it works across event loops.
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+async def stream_completion(llm_client, prompt: str, on_text) -> str:
+    stream = await asyncio.to_thread(
+        llm_client.chat.completions.create,
+        model="gemini-2.5-flash",
+        messages=[{"role": "user", "content": prompt}],
+        stream=True
+    )
+    text = ""
+    try:
+        # Pull chunks off a worker thread so on_text runs on the caller's (Streamlit) thread
+        while (chunk := await asyncio.to_thread(next, stream, None)) is not None:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            text += delta
+            # Stop generating once contact PII shows up; the output guardrail refuses it
+            if contains_contact_pii(text):
+                break
+            on_text(text)
+    finally:
+        stream.close()
+    return text.strip()
+
+async def complete(llm_client, prompt: str, on_text=None) -> str:
+    key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        is_leader = fut is None
+        if is_leader:
+            fut = _inflight[key] = Future()
+
+    if not is_leader:
+        return await asyncio.wrap_future(fut)
+
+    try:
+        if on_text is not None:
+            answer = await stream_completion(llm_client, prompt, on_text)
+        else:
+            # The OpenAI client is sync and thread-safe; offload so independent legs overlap
+            response = await asyncio.to_thread(
+                llm_client.chat.completions.create,
+                model="gemini-2.5-flash",
+                messages=[{"role": "user", "content": prompt}]
+            )
+            answer = response.choices[0].message.content.strip()
+        fut.set_result(answer)
+        return answer
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except Exception as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+async def answer_from_web(llm_client, question: str, web_text: str, on_text=None) -> str:
+    prompt = f"""
+Answer the question using the web data below.
+Be concise and factual.
+Do NOT mention HTML or search engines.
+
+Web data:
+{web_text}
+
+Question:
+{question}
+"""
+    return await complete(llm_client, prompt, on_text=on_text)
+
+# =====================================================
+# Memory Extraction
+# =====================================================
+async def extract_memory(llm_client, question: str, answer: str) -> str | None:
+    question = redact_pii(question)
+    answer = redact_pii(answer)
+    prompt = f"""
+Extract reusable factual knowledge.
+
+Conversation:
+User: {question}
+Assistant: {answer}
+
+Rules:
+- One fact per line
+- No opinions
+- If nothing useful return NONE
+"""
+    memory = await complete(llm_client, prompt)
+    return None if memory == "NONE" else memory
+
+def save_memory_to_store(memory_text: str, store: FaissVectorStore, log_func=print):
+    memory_text = redact_pii(memory_text)
+
+    # 🚫 Block storing if still contains redacted markers
+    if "[REDACTED_" in memory_text:
+        log_func("🚫 Memory blocked due to PII")
+        return
+
+    if store.read_only:
+        log_func("🔒 Memory not saved: vector store is read-only")
+        return
+
+    store.add_texts([memory_text])
+
+
+# =====================================================
+# AGENT LOOP - FIXED
+# =====================================================
+async def learn_from_answer(llm_client, question: str, answer: str, store: FaissVectorStore,
+                            log_func=print):
+    memory = await extract_memory(llm_client, question, answer)
+    if memory:
+        save_memory_to_store(memory, store, log_func=log_func)
+
+
+# Learning runs off the request path on its own thread + event loop: a plain
+# create_task would be cancelled when the caller's asyncio.run() returns
+_learn_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="learn")
+
+def _log_learn_failure(fut: Future):
+    if not fut.cancelled() and fut.exception() is not None:
+        print(f"⚠️ Memory learning failed: {fut.exception()}")
+
+def learn_in_background(llm_client, question: str, answer: str, store: FaissVectorStore) -> Future:
+    # print, not the caller's log_func: Streamlit widgets can't be written from a worker thread
+    fut = _learn_executor.submit(asyncio.run, learn_from_answer(llm_client, question, answer, store))
+    fut.add_done_callback(_log_learn_failure)
+    return fut
+
+
+# Chunks below this cosine similarity are unrelated to the question; with none left the
+# document LLM call is skipped (it could only answer "Not available")
+MIN_RELEVANCE_SCORE = 0.3
+
+async def chat_with_brain(question, llm_client, store, history, top_k=3, results=None, cache=None,
+                          on_text=None, log_func=print):  # log_func: Streamlit or print
+
+    # 🚫 0️⃣ HARD BLOCK PII INTENT (FAIL FAST)
+    if PII_INTENT_PATTERN.search(question):
+        log_func("🚫 PII request blocked before LLM call")
+        return "I can’t help with personal contact or identity details."
+
+    question = redact_pii(question)
+
+    # ⚡ Semantic cache: a near-identical question skips retrieval and every LLM call
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, question)
+        if cached is not None:
+            entry = {"user": question, "bot": cached}
+            history.append(entry)
+            await asyncio.to_thread(append_history, entry)
+            return cached
+
+    # 1️⃣ Vector search (unless the caller batched it)
+    if results is None:
+        results = await asyncio.to_thread(store.query, question, top_k)
+
+    relevant = results
+    if store.scores_are_cosine:
+        relevant = [r for r in results if r["score"] >= MIN_RELEVANCE_SCORE]
+    if results and not relevant:
+        log_func("⏭️ No relevant chunks in the vector store → skipping the document answer")
+
+    context_chunks = []
+    for r in relevant:
+        text = r.get("page_content") or r.get("metadata", {}).get("text", "")
+        if text and len(text.strip()) > 30:
+            context_chunks.append(text)
+
+    context = "\n\n".join(context_chunks)
+    is_doc_question = len(context_chunks) > 0
+
+    # 2️⃣ Answer using documents
+    if is_doc_question:
+        prompt = f"""
+Answer ONLY using the uploaded documents.
+
+Rules:
+- NEVER provide personal contact details
+- NEVER guess phone numbers or emails
+- If info is missing, say "Not available in uploaded documents"
+
+Context:
+{context}
+
+Question:
+{question}
+"""
+        answer = await complete(llm_client, prompt, on_text=on_text)
+    else:
+        answer = "NOT_FOUND"
+
+    # 3️⃣ Web fallback
+    if answer == "NOT_FOUND" or "Not available in uploaded documents" in answer:
+        log_func("🌐 Document insufficient → searching web...")
+        # Only now: questions about private documents never leave the machine unless they
+        # fall back, and a doc answer isn't held up waiting on a search it won't use
+        web_text = await asyncio.to_thread(web_search, question)
+
+        if is_web_data_useless(web_text):
+            answer = await complete(llm_client, question, on_text=on_text)
+        else:
+            answer = await answer_from_web(llm_client, question, web_text, on_text=on_text)
+
+    # 🚫 4️⃣ FAIL-FAST OUTPUT GUARDRAIL (MOST IMPORTANT)
+    if contains_contact_pii(answer):
+        log_func("🚫 Contact PII detected in model output")
+        return "I can’t share personal contact details."
+
+
+    # 5️⃣ Save safe history
+    entry = {
+        "user": question,
+        "bot": redact_pii(answer)
+    }
+    history.append(entry)
+    pending = [asyncio.to_thread(append_history, entry)]
+    if cache is not None:
+        pending.append(asyncio.to_thread(cache.put, question, answer))
+
+    await asyncio.gather(*pending)
+
+    # 6️⃣ Learn only if safe + non-document and the store can take it (read-only evals skip
+    # the extraction call entirely); fire-and-forget so it stays off the answer's latency
+    if not is_doc_question and not store.read_only:
+        learn_in_background(llm_client, question, answer, store)
+
+    return answer
+
+# =====================================================
+# GUARDRAILS – PII DETECTION (FAIL-FAST)
+# =====================================================
+
+PII_INTENT_PATTERN = re.compile(
+    r"\b(phone number|mobile number|contact number|email id|address|aadhaar|pan)\b",
+    re.IGNORECASE
+)
+
+
+def contains_contact_pii(text: str) -> bool:
+    if not text:
+        return False
+
+    # Strong signals only (every PII pattern is one)
+    return PII_RE.search(text) is not None
+
+
+# =====================================================
+# GUARDRAILS – PII REDACTION
+# =====================================================
+
+PII_PATTERNS = {
+    "PHONE": r"(?:\+?\d{1,3}[- ]?)?\d{10}",
+    "EMAIL": r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+",
+    "AADHAAR": r"\b\d{4}\s\d{4}\s\d{4}\b",
+    "PAN": r"\b[A-Z]{5}\d{4}[A-Z]\b",
+}
+
+# One precompiled alternation: a single scan finds every PII kind,
+# and the named group that matched tells us which label to use
+PII_RE = re.compile(
+    "|".join(f"(?P<{label}>{pattern})" for label, pattern in PII_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+def _redaction_label(match: re.Match) -> str:
+    return f"[REDACTED_{match.lastgroup}]"
+
+def redact_pii(text: str) -> str:
+    if not text:
+        return text
+
+    return PII_RE.sub(_redaction_label, text)
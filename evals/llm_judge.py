@@ -1,5 +1,5 @@
 from evals.schemas import AnswerEval
-import json
+import orjson
 
 
 def llm_judge(llm_client, question: str, answer: str, context: str = "") -> AnswerEval:
@@ -44,5 +44,5 @@ Answer:
     # 🔒 HARD SAFETY: strip accidental markdown
     raw = raw.replace("```json", "").replace("```", "").strip()
 
-    data = json.loads(raw)
+    data = orjson.loads(raw)
     return AnswerEval(**data)
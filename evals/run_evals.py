@@ -1,27 +1,52 @@
+import asyncio
+
 from evals.test_cases import EVAL_CASES
 from evals.llm_judge import llm_judge
 
+# Keeps the fan-out well under the Gemini per-minute quota
+MAX_CONCURRENT_CASES = 20
+RETRIEVAL_TOP_K = 3
 
-def run_evals(chat_fn, llm_client, store):
-    print("\n🧪 Running Eval Suite...\n")
 
-    for case in EVAL_CASES:
-        print(f"▶️ {case['name']}")
-
-        answer = chat_fn(
+async def _run_case(case, results, chat_fn, llm_client, store, semaphore):
+    async with semaphore:
+        answer = await chat_fn(
             question=case["question"],
             llm_client=llm_client,
             store=store,
-            history=[]
+            history=[],
+            results=results
         )
 
-        eval_result = llm_judge(
+        eval_result = await asyncio.to_thread(
+            llm_judge,
             llm_client=llm_client,
             question=case["question"],
             answer=answer,
             context=""
         )
+    return case, answer, eval_result
+
+
+async def _run_all(chat_fn, llm_client, store):
+    # Retrieve for every case in a single batched FAISS search
+    all_results = store.query_batch([c["question"] for c in EVAL_CASES], top_k=RETRIEVAL_TOP_K)
 
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CASES)
+    tasks = [
+        _run_case(c, results, chat_fn, llm_client, store, semaphore)
+        for c, results in zip(EVAL_CASES, all_results)
+    ]
+    return await asyncio.gather(*tasks)
+
+
+def run_evals(chat_fn, llm_client, store):
+    # Every case reuses this one loaded store; an empty one would silently test web fallback only
+    assert store.index is not None, "Vector store is empty; ingest documents before running evals"
+    print("\n🧪 Running Eval Suite...\n")
+
+    for case, answer, eval_result in asyncio.run(_run_all(chat_fn, llm_client, store)):
+        print(f"▶️ {case['name']}")
         print("Answer:", answer)
         print("Eval:", eval_result.model_dump())
         print("-" * 50)
@@ -0,0 +1,49 @@
+# rag_pipeline/coalescer.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueryCoalescer:
+    # Micro-batcher: single queries arriving from concurrent callers are gathered
+    # for up to `max_wait` seconds (or `max_batch` queries) and answered with one
+    # encode + one index.search, which costs about the same as a single query.
+    def __init__(self, store, max_batch: int = 32, max_wait: float = 0.005):
+        self.store = store
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def query(self, query_text: str, top_k: int = 5):
+        fut = Future()
+        self._queue.put((query_text, top_k, fut))
+        return fut.result()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            top_k = max(k for _, k, _ in batch)
+            try:
+                results = self.store.query_batch([text for text, _, _ in batch], top_k=top_k)
+            except Exception as e:
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, k, fut), rows in zip(batch, results):
+                fut.set_result(rows[:k])
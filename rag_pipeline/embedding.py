@@ -1,7 +1,92 @@
 # rag_pipeline/embedding.py
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import List
+import diskcache
+import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 
+# Let fp32 matmuls use TF32 tensor cores where the hardware has them
+torch.set_float32_matmul_precision("high")
+
+
+# Shared per model name, so every pipeline and store reuses one model (and one GPU context)
+@lru_cache(maxsize=2)
+def load_embedding_model(model_name: str) -> SentenceTransformer:
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = SentenceTransformer(model_name, device=device)
+    if device == "cuda":
+        # fp16 halves memory traffic and roughly doubles GPU matmul throughput
+        model.half()
+    return model
+
+
+# Long texts (document chunks) rarely repeat; caching them would only churn the LRU
+MAX_CACHED_TEXT_BYTES = 8 * 1024
+
+
+class CachedEncoder:
+    # Drop-in for SentenceTransformer.encode that remembers embeddings of repeated
+    # texts (re-asked questions, eval sweeps). Keyed by a blake2b digest of the text,
+    # LRU-evicted in memory and optionally persisted to disk for warm restarts.
+    def __init__(self, model: SentenceTransformer, model_name: str,
+                 max_entries: int = 10_000, disk_dir: str | None = None):
+        self.model = model
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # digest -> float32 vector, oldest first
+        self._lock = threading.Lock()
+        self._disk = diskcache.Cache(disk_dir) if disk_dir else None
+
+    def _lookup(self, key: bytes):
+        with self._lock:
+            emb = self._entries.get(key)
+            if emb is not None:
+                self._entries.move_to_end(key)
+                return emb
+        if self._disk is not None:
+            emb = self._disk.get((self.model_name, key))
+            if emb is not None:
+                self._remember(key, emb)
+        return emb
+
+    def _remember(self, key: bytes, emb: np.ndarray):
+        with self._lock:
+            self._entries[key] = emb
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        rows = [None] * len(texts)
+        keys = [None] * len(texts)
+        misses = []
+        for i, text in enumerate(texts):
+            raw = text.encode("utf-8")
+            if len(raw) <= MAX_CACHED_TEXT_BYTES:
+                keys[i] = hashlib.blake2b(raw, digest_size=16).digest()
+                rows[i] = self._lookup(keys[i])
+            if rows[i] is None:
+                misses.append(i)
+
+        if misses:
+            # Only the misses hit the model, still as one batch
+            kwargs["convert_to_numpy"] = True
+            embs = self.model.encode([texts[i] for i in misses], **kwargs).astype("float32")
+            for i, emb in zip(misses, embs):
+                rows[i] = emb
+                if keys[i] is not None:
+                    self._remember(keys[i], emb)
+                    if self._disk is not None:
+                        self._disk.set((self.model_name, keys[i]), emb)
+
+        if not rows:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype="float32")
+        return np.vstack(rows)
+
 
 class EmbeddingPipeline:
     def __init__(
@@ -9,24 +94,37 @@ class EmbeddingPipeline:
         model_name: str = "all-MiniLM-L6-v2",
         chunk_size: int = 1000,
         chunk_overlap: int = 200,
+        batch_size: int = 256,
     ):
-        self.model = SentenceTransformer(model_name)
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+        self.model = load_embedding_model(model_name)
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
 
     def chunk_documents(self, documents: List):
         chunks = []
+        step = self.chunk_size - self.chunk_overlap
 
         for doc in documents:
             text = doc.page_content if hasattr(doc, "page_content") else str(doc)
-            start = 0
-
-            while start < len(text):
-                end = start + self.chunk_size
-                chunks.append(text[start:end])
-                start = end - self.chunk_overlap
+            chunks.extend(text[start:start + self.chunk_size] for start in range(0, len(text), step))
 
         return chunks
 
-    def embed_chunks(self, chunks: List[str]):
-        return self.model.encode(chunks, show_progress_bar=True)
+    def embed_chunks(self, chunks: List[str]) -> np.ndarray:
+        # Blocks of several encode batches (so length-sorting still pads well) are written
+        # straight into one preallocated float32 matrix: no per-block list + vstack,
+        # and an fp16 model's output is converted block by block
+        out = np.empty((len(chunks), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        block = self.batch_size * 4
+        for start in range(0, len(chunks), block):
+            out[start:start + block] = self.model.encode(
+                chunks[start:start + block],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return out
@@ -1,31 +1,46 @@
 # ingest.py
 import os
-from typing import List
+from typing import Iterator, List
 
-from rag_pipeline.loader import load_file
+from rag_pipeline.loader import load_files
 from rag_pipeline.vector_store import FaissVectorStore
 
 
-def ingest_paths(paths: List[str], persist_dir: str = "faiss_store"):
-    documents = []
+def _iter_files(path: str) -> Iterator[str]:
+    # os.scandir hands back the file type with each entry, so no extra stat per file
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                # Like os.walk: symlinked directories are neither followed nor loaded as files
+                if not entry.is_symlink():
+                    yield from _iter_files(entry.path)
+                continue
+            yield entry.path
 
+
+def ingest_paths(paths: List[str], persist_dir: str = "faiss_store",
+                 vector_store: FaissVectorStore | None = None):
+    files = []
     for path in paths:
         if os.path.isdir(path):
-            for root, _, files in os.walk(path):
-                for file in files:
-                    documents.extend(load_file(os.path.join(root, file)))
+            files.extend(_iter_files(path))
         else:
-            documents.extend(load_file(path))
+            files.append(path)
+
+    # Parsing PDF/DOCX is CPU-bound Python, so files are spread over worker processes
+    documents = load_files(files)
 
     if not documents:
         raise ValueError("No documents found for ingestion")
 
-    vector_store = FaissVectorStore(persist_dir=persist_dir)
+    # Pass the live store to add into it in place; otherwise a fresh store is built
+    if vector_store is None:
+        vector_store = FaissVectorStore(persist_dir=persist_dir)
 
     # Chunking + Embedding + Storing happens INSIDE this call
     vector_store.build_from_documents(documents)
 
     return {
         "documents_loaded": len(documents),
-        "vector_store": persist_dir
+        "vector_store": vector_store.persist_dir
     }
@@ -1,38 +1,210 @@
+import codecs
+import hashlib
+import mmap
 import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, List
 from langchain_core.documents import Document
-import PyPDF2
+import diskcache
 import docx
+from lxml import etree
 
-def load_file(file_path: str) -> List[Document]:
-    suffix = Path(file_path).suffix.lower()
-    documents = []
-
-    if suffix == ".txt":
-        with open(file_path, "r", encoding="utf-8") as f:
-            text = f.read()
-            documents.append(Document(page_content=text, metadata={"source": file_path}))
-
-    elif suffix == ".pdf":
-        text = ""
-        with open(file_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-        documents.append(Document(page_content=text, metadata={"source": file_path}))
-
-    elif suffix == ".docx":
-        doc = docx.Document(file_path)
-        text = "\n".join([para.text for para in doc.paragraphs])
-        documents.append(Document(page_content=text, metadata={"source": file_path}))
+# PDFium (C++) and MuPDF (C) extract text far faster than pure-Python parsers
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+    import fitz  # PyMuPDF
+
+
+# Survives restarts and is shared with the worker processes used by load_files;
+# least recently stored entries are evicted past the size limit
+_DISK_CACHE = diskcache.Cache(".cache/loader", size_limit=512 * 1024 * 1024)
+
+# Part of every cache key: bump it whenever a SUFFIX_HANDLERS extractor changes its output,
+# so text parsed by the old code isn't served again
+LOADER_CACHE_VERSION = 2
+
+# Text files above this size are split into several Documents
+LARGE_TEXT_BYTES = 16 * 1024 * 1024
+
+
+def _normalize_newlines(text: str) -> str:
+    # Binary reads skip text mode's universal newlines, so CRLF / CR notes are translated here
+    if "\r" not in text:
+        return text
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _read_text_parts(file_path: str) -> List[str]:
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return [""]  # mmap refuses empty files
+        # Decode straight from the mapped pages: no bytes copy of the whole file
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if size <= LARGE_TEXT_BYTES:
+                return [_normalize_newlines(codecs.utf_8_decode(mm, "replace", True)[0])]
+            # The incremental decoder carries multi-byte characters split across windows;
+            # a trailing "\r" is held back in case its "\n" starts the next window
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            parts, carry = [], ""
+            for start in range(0, size, LARGE_TEXT_BYTES):
+                text = carry + decoder.decode(mm[start:start + LARGE_TEXT_BYTES])
+                carry = "\r" if text.endswith("\r") else ""
+                parts.append(_normalize_newlines(text[:-1] if carry else text))
+            parts[-1] += _normalize_newlines(carry + decoder.decode(b"", final=True))
+            return parts
+
+
+# Below this many pages a worker pool costs more than it saves
+PARALLEL_PDF_MIN_PAGES = 4
+
+
+def _pdf_page_count(file_path: str) -> int:
+    if pdfium is None:
+        with fitz.open(file_path) as pdf:
+            return pdf.page_count
+
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _extract_pdf_pages(file_path: str, page_indices) -> List[str]:
+    if pdfium is None:
+        with fitz.open(file_path) as pdf:
+            return [pdf[i].get_text("text") or "" for i in page_indices]
+
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        parts = []
+        for i in page_indices:
+            page = pdf[i]
+            textpage = page.get_textpage()
+            # Image-only pages have no text layer; keep them as empty parts
+            parts.append(textpage.get_text_range() or "")
+            # Release native memory page by page rather than at document close
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+    return parts
 
-    elif suffix == ".md":
-        with open(file_path, "r", encoding="utf-8") as f:
-            text = f.read()
-            documents.append(Document(page_content=text, metadata={"source": file_path}))
 
+def _extract_pdf_text(file_path: str, parallel: bool = True) -> str:
+    n_pages = _pdf_page_count(file_path)
+    if parallel and n_pages > PARALLEL_PDF_MIN_PAGES:
+        # Pages are independent and CPU-bound, so they spread across cores. Each worker
+        # opens and parses the document once, so it gets one contiguous range of pages
+        workers = min(os.cpu_count() or 1, n_pages)
+        step = -(-n_pages // workers)  # ceil
+        ranges = [range(start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            per_range = executor.map(partial(_extract_pdf_pages, file_path), ranges)
+            parts = [text for texts in per_range for text in texts]
     else:
+        parts = _extract_pdf_pages(file_path, range(n_pages))
+    return "\n".join(parts)
+
+
+def load_files(paths: List[str]) -> List[Document]:
+    if len(paths) <= 1:
+        return [doc for path in paths for doc in load_file(path)]
+
+    # Whole files fan out across processes; pages are not split again inside a worker
+    with ProcessPoolExecutor() as executor:
+        per_file = executor.map(partial(load_file, parallel=False), paths)
+        return [doc for docs in per_file for doc in docs]
+
+
+def _file_digest(file_path: str) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def load_file(file_path: str, parallel: bool = True) -> List[Document]:
+    suffix = Path(file_path).suffix.lower()
+    handler = SUFFIX_HANDLERS.get(suffix)
+    if handler is None:
         raise ValueError(f"Unsupported file type: {suffix}")
 
-    return documents
+    # Extracted text is cached by content: the app ingests uploads through randomly named
+    # temp files, so a path/mtime key would never repeat. Hashing is far cheaper than parsing.
+    key = (LOADER_CACHE_VERSION, _file_digest(file_path), suffix)
+    parts = _DISK_CACHE.get(key)
+    if parts is None:
+        parts = handler(file_path, parallel)
+        _DISK_CACHE.set(key, parts)
+
+    # New Documents on every call, attributed to this path rather than the one first cached
+    return [Document(page_content=text, metadata={"source": file_path}) for text in parts]
+
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P, _W_R, _W_T = _W_NS + "p", _W_NS + "r", _W_NS + "t"
+_W_TAB, _W_BR, _W_CR = _W_NS + "tab", _W_NS + "br", _W_NS + "cr"
+_W_TEXT_TAGS = (_W_T, _W_TAB, _W_BR, _W_CR)
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+
+def _run_element_text(elem) -> str:
+    # Same mapping as python-docx's Run.text
+    if elem.tag == _W_T:
+        return elem.text or ""
+    if elem.getparent().tag != _W_R:
+        return ""  # e.g. <w:tab> tab-stop definitions inside paragraph properties
+    if elem.tag == _W_TAB:
+        return "\t"
+    if elem.tag == _W_BR and elem.get(_W_NS + "type", "textWrapping") != "textWrapping":
+        return ""  # page and column breaks
+    return "\n"
+
+
+def _extract_docx_text(file_path: str) -> str:
+    # A .docx is a zip of XML: stream the text, tab and break elements of each <w:p>
+    # instead of building python-docx's object model
+    try:
+        with zipfile.ZipFile(file_path) as zf, zf.open("word/document.xml") as xml:
+            # Paragraphs nest (textboxes hold their own <w:p>), so each open paragraph keeps
+            # its slot in document order and runs go to the innermost one
+            paragraphs, open_runs = [], []
+            fallback_depth = 0  # inside <mc:Fallback>: a duplicate rendering of the <mc:Choice>
+            for event, elem in etree.iterparse(xml, events=("start", "end")):
+                if elem.tag == _MC_FALLBACK:
+                    fallback_depth += 1 if event == "start" else -1
+                elif fallback_depth:
+                    continue
+                elif elem.tag == _W_P:
+                    if event == "start":
+                        open_runs.append((len(paragraphs), []))
+                        paragraphs.append("")
+                    else:
+                        slot, runs = open_runs.pop()
+                        paragraphs[slot] = "".join(runs)
+                        elem.clear(keep_tail=True)
+                elif event == "end" and elem.tag in _W_TEXT_TAGS and open_runs:
+                    open_runs[-1][1].append(_run_element_text(elem))
+            return "\n".join(p for p in paragraphs if p)
+    except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError):
+        # Unusual packaging: let python-docx sort it out
+        doc = docx.Document(file_path)
+        return "\n".join(p.text for p in doc.paragraphs if p.text)
+
+
+# suffix -> handler(file_path, parallel) returning the file's text, in one or more parts.
+# New formats register here; load_file turns the parts into Documents.
+SUFFIX_HANDLERS: Dict[str, Callable[[str, bool], List[str]]] = {
+    ".txt": lambda path, parallel: _read_text_parts(path),
+    ".md": lambda path, parallel: _read_text_parts(path),
+    ".pdf": lambda path, parallel: [_extract_pdf_text(path, parallel=parallel)],
+    ".docx": lambda path, parallel: [_extract_docx_text(path)],
+}
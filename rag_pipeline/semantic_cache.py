@@ -0,0 +1,115 @@
+# rag_pipeline/semantic_cache.py
+import os
+import pickle
+import threading
+import faiss
+import numpy as np
+
+
+class SemanticCache:
+    # Question embedding -> answer cache. A hit skips the whole LLM round-trip
+    # when a new question is (near-)identical to one answered before.
+    def __init__(self, model, persist_dir: str = "semantic_cache",
+                 threshold: float = 0.92,
+                 max_entries: int = 10_000,
+                 log_func=print):
+        self.model = model  # share the vector store's (cached) encoder
+        self.persist_dir = persist_dir
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.log = log_func
+
+        # IndexIDMap over IndexFlatIP on L2-normalized embeddings = cosine similarity;
+        # explicit ids let the oldest entries be removed once the cache is full
+        self.index = None
+        self.answers = {}   # FAISS id -> answer, in insertion (FIFO) order
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str) -> np.ndarray:
+        emb = np.ascontiguousarray(self.model.encode([text], convert_to_numpy=True), dtype="float32")
+        faiss.normalize_L2(emb)
+        return emb
+
+    def get(self, question: str):
+        answer = None
+        if self.index is not None and self.index.ntotal > 0:
+            emb = self._embed(question)
+            with self._lock:
+                D, I = self.index.search(emb, 1)
+                if D[0, 0] >= self.threshold:
+                    answer = self.answers.get(int(I[0, 0]))
+
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.log(f"[INFO] Semantic cache hit (similarity {D[0, 0]:.3f}, "
+                         f"{self.hits} hits / {self.misses} misses)")
+        return answer
+
+    def put(self, question: str, answer: str):
+        emb = self._embed(question)
+        with self._lock:
+            if self.index is None:
+                self.index = faiss.IndexIDMap(faiss.IndexFlatIP(emb.shape[1]))
+            cache_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(emb, np.array([cache_id], dtype=np.int64))
+            self.answers[cache_id] = answer
+            self._evict()
+
+    def _evict(self):
+        overflow = len(self.answers) - self.max_entries
+        if overflow <= 0:
+            return
+        oldest = [cache_id for cache_id, _ in zip(self.answers, range(overflow))]
+        self.index.remove_ids(np.array(oldest, dtype=np.int64))
+        for cache_id in oldest:
+            del self.answers[cache_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.answers)}
+
+    def clear(self):
+        with self._lock:
+            self.index = None
+            self.answers = {}
+            self._next_id = 0
+        self.log("[INFO] Semantic cache cleared")
+
+    def save(self):
+        os.makedirs(self.persist_dir, exist_ok=True)
+        faiss_path = os.path.join(self.persist_dir, "cache.index")
+        answers_path = os.path.join(self.persist_dir, "answers.pkl")
+        with self._lock:
+            if self.index is None:
+                for path in (faiss_path, answers_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                return
+            faiss.write_index(self.index, faiss_path)
+            with open(answers_path, "wb") as f:
+                pickle.dump(self.answers, f)
+        self.log(f"[INFO] Saved semantic cache to {self.persist_dir}")
+
+    def load(self):
+        faiss_path = os.path.join(self.persist_dir, "cache.index")
+        answers_path = os.path.join(self.persist_dir, "answers.pkl")
+        if not os.path.exists(faiss_path) or not os.path.exists(answers_path):
+            return
+        index = faiss.read_index(faiss_path)
+        if not isinstance(index, faiss.IndexIDMap):
+            # Written before ids were explicit; the cache is disposable, so start fresh
+            self.log("[WARNING] Discarding semantic cache in old format")
+            return
+        with self._lock:
+            self.index = index
+            with open(answers_path, "rb") as f:
+                self.answers = pickle.load(f)
+            self._next_id = max(self.answers, default=-1) + 1
+        self.log(f"[INFO] Loaded semantic cache from {self.persist_dir}")
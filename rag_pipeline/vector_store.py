@@ -1,22 +1,121 @@
 import os
+import mmap
 import faiss
 import numpy as np
 import pickle
+import tempfile
+import threading
 from typing import List, Any
-from sentence_transformers import SentenceTransformer
-from rag_pipeline.embedding import EmbeddingPipeline
+from rag_pipeline.embedding import CachedEncoder, EmbeddingPipeline, load_embedding_model
+from rag_pipeline.coalescer import QueryCoalescer
+
+# Cap FAISS at half the cores so it doesn't fight the embedding model's BLAS threads
+faiss.omp_set_num_threads(max(1, (os.cpu_count() or 2) // 2))
+
+# HNSW beam width per query is at least this many times top_k, so large k keeps its recall
+EF_SEARCH_FACTOR = 4
+
+# HNSW graph parameters: neighbours per node, build-time and query-time beam widths
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Flat search is O(N·d) per query; past this many vectors a loaded Flat index is rebuilt as HNSW
+HNSW_MIGRATION_THRESHOLD = 50_000
+
+# IVF-PQ: 16 sub-quantizers x 8 bits = 16 bytes per vector. k-means wants ~39 training
+# points per centroid, so smaller corpora stay on the exact Flat index.
+IVFPQ_M = 16
+IVFPQ_NBITS = 8
+IVFPQ_MIN_TRAIN = 39 * 2 ** IVFPQ_NBITS
+IVFPQ_NPROBE = int(os.getenv("VECTORSTORE_NPROBE", "16"))  # inverted lists scanned per query
+
+# Rows in each thread's reusable query buffer (grown if a batch is bigger)
+QUERY_BUFFER_ROWS = 64
+
+# Embeddings are L2-normalized at the store boundary, so inner product == cosine similarity
+# and scores are "larger is closer"
+METRIC = faiss.METRIC_INNER_PRODUCT
+
+# Opt-in, so dev laptops with a GPU-enabled faiss build keep CPU behaviour
+USE_GPU = os.getenv("VECTORSTORE_USE_GPU") == "1"
+
+
+# Flat index files ("IxF2" L2, "IxFI" inner product) can be used in place from a mapping
+_FLAT_MAGICS = (b"IxF2", b"IxFI")
+
+
+def _read_flags(path: str, read_only: bool) -> int:
+    if not read_only:
+        # A writable index needs its own in-memory copy: with IO_FLAG_MMAP, IVF inverted
+        # lists become read-only OnDiskInvertedLists and every add fails
+        return 0
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    # Plain IO_FLAG_MMAP still copies Flat vectors into RAM; MMAP_IFC searches the mapping
+    # itself, so the pages come from the shared page cache
+    if magic in _FLAT_MAGICS and hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return faiss.IO_FLAG_MMAP_IFC
+    return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+
+
+def _prewarm(path: str):
+    # Pull the index file into the page cache (shared with FAISS's own mapping) up front
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_WILLNEED)
+        for offset in range(0, len(mm), mmap.PAGESIZE):
+            mm[offset]
+
+
+def _pickle_to(obj, path: str):
+    with open(path, "wb") as f:
+        pickle.dump(obj, f)
+
+
+def _replace_atomically(path: str, write):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.array(vectors, dtype='float32', order='C')  # copy: normalize_L2 works in place
+    faiss.normalize_L2(vectors)
+    return vectors
+
 
 class FaissVectorStore:
     def __init__(self, persist_dir: str = "faiss_store",
                  embedding_model: str = "all-MiniLM-L12-v2",
                  chunk_size: int = 1000,
                  chunk_overlap: int = 200,
+                 flush_every: int = 32,
+                 index_type: str = "flat",  # "flat" (exact), "hnsw" (~log N search) or "ivfpq" (compressed)
+                 coalesce_queries: bool = False,  # batch concurrent query() calls into one search
+                 embedding_cache_dir: str | None = None,  # persist query embeddings across restarts
                  log_func=print):  # allow logging function (Streamlit or print)
         self.persist_dir = persist_dir
         os.makedirs(self.persist_dir, exist_ok=True)
 
         self.index = None
         self.metadata = []
+        # Guards the index and the pending buffer across threads
+        self._lock = threading.RLock()
+        self._pending = []
+        self._buffers = threading.local()  # per-thread query buffer, see _query_buffer
+        self._on_gpu = False
+        self.read_only = False
+        self.flush_every = flush_every
+        if index_type not in ("flat", "hnsw", "ivfpq"):
+            raise ValueError(f"Unsupported index type: {index_type}")
+        self.index_type = index_type
+        self._coalescer = QueryCoalescer(self) if coalesce_queries else None
         self.embedding_model = embedding_model
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
@@ -24,7 +123,8 @@ class FaissVectorStore:
 
         self.log(f"[INFO] Creating embedding model '{embedding_model}' (may take a while)...")
         try:
-            self.model = SentenceTransformer(embedding_model)
+            self.model = load_embedding_model(embedding_model)
+            self.encoder = CachedEncoder(self.model, embedding_model, disk_dir=embedding_cache_dir)
             self.log(f"[INFO] Loaded embedding model: {embedding_model}")
         except Exception as e:
             self.log(f"[ERROR] Failed to load embedding model: {e}")
@@ -39,34 +139,114 @@ class FaissVectorStore:
         embeddings = emb_pipe.embed_chunks(chunks)
         metadatas = [{"text": chunk} for chunk in chunks]
 
-        self.add_embeddings(np.array(embeddings).astype('float32'), metadatas)
+        self.add_embeddings(embeddings, metadatas)  # already one float32 matrix -> one index.add
         self.save()
         self.log(f"[INFO] Vector store built and saved to {self.persist_dir}")
 
+    def add_texts(self, texts: List[str]):
+        # Buffered: texts are embedded and added in one batch every `flush_every` additions
+        self._check_writable()
+        with self._lock:
+            self._pending.extend(texts)
+            should_flush = len(self._pending) >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            texts, self._pending = self._pending, []
+            if not texts:
+                return
+            try:
+                embeddings = self.encoder.encode(texts)
+                self.add_embeddings(embeddings, [{"text": text} for text in texts])
+            except Exception:
+                # Nothing reached the index: keep the texts buffered for the next flush
+                self._pending = texts + self._pending
+                raise
+            # If this fails the vectors are still in memory and go out with the next save;
+            # re-buffering them would add duplicates
+            self.save()
+
     def add_embeddings(self, embeddings: np.ndarray, metadatas: List[Any] = None):
         if embeddings.ndim != 2:
             raise ValueError("Embeddings must be a 2D numpy array")
+        self._check_writable()
+        embeddings = _normalized(embeddings)
         dim = embeddings.shape[1]
-        if self.index is None:
-            self.index = faiss.IndexFlatL2(dim)
-            self.log(f"[INFO] Initialized FAISS index with dimension {dim}")
-        self.index.add(embeddings)
-        if metadatas:
-            self.metadata.extend(metadatas)
+        with self._lock:
+            if self.index is None:
+                self.build(embeddings)
+                self.log(f"[INFO] Initialized FAISS {self.index_type} index with dimension {dim}")
+            else:
+                self.index.add(embeddings)
+            if metadatas:
+                self.metadata.extend(metadatas)
         self.log(f"[INFO] Added {embeddings.shape[0]} vectors to FAISS index")
 
+    def build(self, vectors: np.ndarray):
+        # Creates the index for `vectors` (training it first for IVF-PQ) and adds them
+        vectors = _normalized(vectors)
+        with self._lock:
+            self.index = self._to_device(self._new_index(vectors))
+            self.index.add(vectors)
+
+    def _new_index(self, vectors: np.ndarray):
+        n, dim = vectors.shape
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, METRIC)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        elif self.index_type == "ivfpq" and n >= IVFPQ_MIN_TRAIN:
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, int(np.sqrt(n)), IVFPQ_M, IVFPQ_NBITS, METRIC)
+            index.train(vectors)
+        else:
+            if self.index_type == "ivfpq":
+                self.log(f"[INFO] {n} vectors are too few to train IVF-PQ; using a Flat index")
+            index = faiss.IndexFlatIP(dim)
+        self._tune_search(index)
+        return index
+
+    def _to_device(self, index):
+        # Batched k-NN is much faster on GPU; HNSW has no GPU implementation, so stays on CPU
+        self._on_gpu = False
+        if not USE_GPU or isinstance(index, faiss.IndexHNSW) or faiss.get_num_gpus() == 0:
+            return index
+        self._on_gpu = True
+        self.log(f"[INFO] Moving FAISS index to {faiss.get_num_gpus()} GPU(s)")
+        return faiss.index_cpu_to_all_gpus(index)
+
+    @staticmethod
+    def _tune_search(index):
+        # Query-time knobs are not reliably persisted, so they are set on every create/load
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        elif isinstance(index, faiss.IndexIVF):
+            index.nprobe = IVFPQ_NPROBE
+
     def save(self):
         if self.index is None:
             self.log("[WARNING] No index to save")
             return
         faiss_path = os.path.join(self.persist_dir, "faiss.index")
         meta_path = os.path.join(self.persist_dir, "metadata.pkl")
-        faiss.write_index(self.index, faiss_path)
-        with open(meta_path, "wb") as f:
-            pickle.dump(self.metadata, f)
+        with self._lock:
+            # GPU indexes can't be serialized directly
+            index = faiss.index_gpu_to_cpu(self.index) if self._on_gpu else self.index
+            # Write beside the target, then rename over it: processes that have the old file
+            # mapped (read-only loads) keep its inode instead of faulting on a truncated file
+            _replace_atomically(faiss_path, lambda tmp: faiss.write_index(index, tmp))
+            _replace_atomically(meta_path, lambda tmp: _pickle_to(self.metadata, tmp))
         self.log(f"[INFO] Saved FAISS index and metadata to {self.persist_dir}")
 
-    def load(self):
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"Vector store {self.persist_dir} was loaded read-only")
+
+    def load(self, read_only: bool = False, prewarm: bool = False):
+        # read_only: adds are refused and Flat indexes are searched straight from the mapped
+        # file (no private copy). prewarm: for such zero-copy loads, fault the pages in now
+        # rather than on the first queries
         faiss_path = os.path.join(self.persist_dir, "faiss.index")
         meta_path = os.path.join(self.persist_dir, "metadata.pkl")
 
@@ -76,27 +256,106 @@ class FaissVectorStore:
             self.metadata = []
             return
 
-        self.index = faiss.read_index(faiss_path)
+        flags = _read_flags(faiss_path, read_only)
+        if prewarm and flags == getattr(faiss, "IO_FLAG_MMAP_IFC", None):
+            # Other loads copy the file into RAM anyway; warming the cache first would read it twice
+            _prewarm(faiss_path)
+        index = faiss.read_index(faiss_path, flags)
         with open(meta_path, "rb") as f:
-            self.metadata = pickle.load(f)
-            print(len(self.metadata))
+            metadata = pickle.load(f)
+            print(len(metadata))
+        self._tune_search(index)
+        with self._lock:
+            self.index = index
+            self.metadata = metadata
+            self.read_only = read_only
         self.log(f"[INFO] Loaded FAISS index and metadata from {self.persist_dir}")
 
+        if read_only:
+            # Rebuilds rewrite the file; leave that to a writable load
+            with self._lock:
+                self.index = self._to_device(index)
+            return
+
+        # One-time rebuilds; both need the stored vectors, which Flat and HNSWFlat keep
+        if isinstance(index, faiss.IndexFlat) and index.ntotal > HNSW_MIGRATION_THRESHOLD:
+            self._rebuild("hnsw", "Flat search is O(N) at this size")
+        elif index.metric_type != METRIC and isinstance(index, (faiss.IndexFlat, faiss.IndexHNSWFlat)):
+            index_type = "hnsw" if isinstance(index, faiss.IndexHNSW) else "flat"
+            self._rebuild(index_type, "switching from L2 to normalized inner product")
+        else:
+            with self._lock:
+                self.index = self._to_device(index)
+
+    def _rebuild(self, index_type: str, reason: str):
+        self.log(f"[INFO] Rebuilding {self.index.ntotal} vectors as a {index_type} index ({reason})...")
+        with self._lock:
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+            self.index_type = index_type
+            self.build(vectors)
+            self.save()
+
+    @property
+    def scores_are_cosine(self) -> bool:
+        # False for L2 indexes (e.g. an old store loaded read-only, which skips the IP rebuild):
+        # their "score" is a squared distance, smaller is closer
+        return self.index is not None and self.index.metric_type == faiss.METRIC_INNER_PRODUCT
+
     def search(self, query_embedding: np.ndarray, top_k: int = 5):
+        if query_embedding.ndim != 2:
+            query_embedding = np.asarray(query_embedding).reshape(1, -1)
+        return self.search_batch(query_embedding, top_k=top_k)[0]
+
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 5):
         if self.index is None:
             self.log("[WARNING] Search called on empty index")
-            return []
-        if query_embedding.ndim != 2:
-            query_embedding = np.array(query_embedding).reshape(1, -1).astype('float32')
+            return [[] for _ in range(len(query_embeddings))]
+
+        query_embeddings = self._query_buffer(query_embeddings)
+        if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            # Normalized once per batch, in place; the index holds normalized vectors already
+            faiss.normalize_L2(query_embeddings)
+
+        with self._lock:
+            if isinstance(self.index, faiss.IndexHNSW) and top_k * EF_SEARCH_FACTOR > HNSW_EF_SEARCH:
+                # HNSWFlat already returns exact distances for what it finds; a wider beam
+                # (not a re-rank) is what improves recall once k approaches efSearch
+                params = faiss.SearchParametersHNSW(efSearch=top_k * EF_SEARCH_FACTOR)
+                D, I = self.index.search(query_embeddings, top_k, params=params)
+            else:
+                D, I = self.index.search(query_embeddings, top_k)
+        return [self._to_results(ids, dists) for ids, dists in zip(I, D)]
 
-        D, I = self.index.search(query_embedding, top_k)
+    def _query_buffer(self, queries: np.ndarray) -> np.ndarray:
+        # FAISS wants C-contiguous float32; copying into a warm per-thread buffer
+        # avoids allocating a fresh array for every search
+        n, d = queries.shape
+        buf = getattr(self._buffers, "query", None)
+        if buf is None or buf.shape[0] < n or buf.shape[1] != d:
+            buf = self._buffers.query = np.empty((max(n, QUERY_BUFFER_ROWS), d), dtype=np.float32)
+        view = buf[:n]
+        np.copyto(view, queries, casting="same_kind")
+        return view
+
+    def _to_results(self, ids: np.ndarray, scores: np.ndarray):
+        # Rows arrive best first; "score" is cosine similarity for inner-product indexes
         results = []
-        for idx, dist in zip(I[0], D[0]):
+        for idx, score in zip(ids, scores):
+            if idx < 0:  # FAISS pads with -1 when fewer than top_k vectors exist
+                continue
             meta = self.metadata[idx] if idx < len(self.metadata) else None
-            results.append({"index": idx, "distance": dist, "metadata": meta})
+            results.append({"index": idx, "score": score, "metadata": meta})
         return results
 
     def query(self, query_text: str, top_k: int = 5):
         self.log(f"[INFO] Querying vector store for: '{query_text}'")
-        query_emb = self.model.encode([query_text]).astype('float32')
+        if self._coalescer is not None:
+            return self._coalescer.query(query_text, top_k=top_k)
+        query_emb = self.encoder.encode([query_text])
         return self.search(query_emb, top_k=top_k)
+
+    def query_batch(self, query_texts: List[str], top_k: int = 5):
+        # One encode + one index.search for all queries amortizes the BLAS overhead
+        self.log(f"[INFO] Querying vector store for {len(query_texts)} queries")
+        query_embs = self.encoder.encode(query_texts, batch_size=64)
+        return self.search_batch(query_embs, top_k=top_k)
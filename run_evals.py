@@ -1,9 +1,7 @@
 from evals.run_evals import run_evals
-from app import chat_with_brain, init_gemini_client
-from rag_pipeline.vector_store import FaissVectorStore
+from brain.core import chat_with_brain, get_client, get_store
 
-llm = init_gemini_client()
-store = FaissVectorStore("faiss_store")
-store.load()
+llm = get_client()
+store = get_store(read_only=True)
 
 run_evals(chat_with_brain, llm, store)
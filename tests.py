@@ -1,5 +1,24 @@
+import shutil
+import tempfile
 import unittest
 from main import add   # assuming file name is add.py
+
+try:
+    import numpy as np
+    from rag_pipeline.vector_store import FaissVectorStore
+except ImportError:  # faiss / sentence-transformers not installed
+    FaissVectorStore = None
+
+try:
+    from brain.core import contains_contact_pii, redact_pii
+except ImportError:  # app dependencies (openai, requests, faiss...) not installed
+    redact_pii = None
+
+try:
+    from rag_pipeline import loader
+    from rag_pipeline.loader import _extract_docx_text
+except ImportError:  # lxml / python-docx not installed
+    loader = _extract_docx_text = None
 class TestAddFunction(unittest.TestCase):
 
     def test_positive_numbers(self):
@@ -18,5 +37,151 @@ class TestAddFunction(unittest.TestCase):
         self.assertEqual(add(0, 0), 0)
 
 
+@unittest.skipIf(redact_pii is None, "app dependencies not installed")
+class TestPiiGuardrails(unittest.TestCase):
+
+    def test_each_label_is_redacted(self):
+        cases = {
+            "Call +91 9876543210 now": "Call [REDACTED_PHONE] now",
+            "Call 9876543210": "Call [REDACTED_PHONE]",
+            "mail a.b@example.com": "mail [REDACTED_EMAIL]",
+            "Aadhaar 1234 5678 9012": "Aadhaar [REDACTED_AADHAAR]",
+            "PAN ABCDE1234F": "PAN [REDACTED_PAN]",
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(redact_pii(text), expected)
+                self.assertTrue(contains_contact_pii(text))
+
+    def test_email_wins_over_embedded_phone(self):
+        # One scan, leftmost match: the whole address is one EMAIL, not a PHONE inside it
+        self.assertEqual(redact_pii("abc9876543210@gmail.com"), "[REDACTED_EMAIL]")
+
+    def test_clean_text_is_untouched(self):
+        text = "Hello world, 2024 was fine"
+        self.assertEqual(redact_pii(text), text)
+        self.assertFalse(contains_contact_pii(text))
+        self.assertEqual(redact_pii(""), "")
+        self.assertFalse(contains_contact_pii(None))
+
+
+@unittest.skipIf(FaissVectorStore is None, "vector store dependencies not installed")
+class TestFaissVectorStore(unittest.TestCase):
+
+    def setUp(self):
+        self.persist_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.persist_dir)
+
+    def make_store(self, **kwargs):
+        return FaissVectorStore(persist_dir=self.persist_dir, log_func=lambda msg: None, **kwargs)
+
+    def save_random(self, n, dim=384, **kwargs):
+        store = self.make_store(**kwargs)
+        vectors = np.random.default_rng(0).random((n, dim), dtype=np.float32)
+        store.add_embeddings(vectors, [{"text": f"chunk {i}"} for i in range(n)])
+        store.save()
+        return vectors
+
+    def test_read_only_load_refuses_adds(self):
+        self.save_random(5)
+        store = self.make_store()
+        store.load(read_only=True)
+        self.assertTrue(store.read_only)
+        with self.assertRaises(RuntimeError):
+            store.add_texts(["a new memory"])
+        self.assertEqual(store.index.ntotal, 5)
+
+    def test_l2_store_loaded_read_only_has_distance_scores(self):
+        import os, pickle, faiss
+        index = faiss.IndexFlatL2(8)
+        index.add(np.random.default_rng(0).random((3, 8), dtype=np.float32))
+        faiss.write_index(index, os.path.join(self.persist_dir, "faiss.index"))
+        with open(os.path.join(self.persist_dir, "metadata.pkl"), "wb") as f:
+            pickle.dump([{"text": str(i)} for i in range(3)], f)
+        store = self.make_store()
+        store.load(read_only=True)
+        self.assertFalse(store.scores_are_cosine)
+
+        store = self.make_store()
+        store.load()  # writable load rebuilds it as inner product
+        self.assertTrue(store.scores_are_cosine)
+
+    def test_reloaded_ivfpq_store_accepts_adds(self):
+        from rag_pipeline.vector_store import IVFPQ_MIN_TRAIN
+        self.save_random(IVFPQ_MIN_TRAIN, dim=64, index_type="ivfpq")
+        store = self.make_store(index_type="ivfpq")
+        store.load()
+        store.add_embeddings(np.random.default_rng(1).random((2, 64), dtype=np.float32),
+                             [{"text": "x"}, {"text": "y"}])
+        store.save()
+        self.assertEqual(store.index.ntotal, IVFPQ_MIN_TRAIN + 2)
+
+
+@unittest.skipIf(loader is None, "loader dependencies not installed")
+class TestReadTextParts(unittest.TestCase):
+
+    def read(self, data: bytes, window: int):
+        import os
+        from unittest import mock
+        path = os.path.join(tempfile.mkdtemp(), "note.txt")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(data)
+        with mock.patch.object(loader, "LARGE_TEXT_BYTES", window):
+            return loader._read_text_parts(path)
+
+    def test_small_file_normalizes_newlines(self):
+        self.assertEqual(self.read(b"a\r\nb\rc\n", 1024), ["a\nb\nc\n"])
+
+    def test_empty_file(self):
+        self.assertEqual(self.read(b"", 4), [""])
+
+    def test_crlf_split_across_windows(self):
+        parts = self.read(b"abc\r\ndef", 4)  # windows: "abc\r" | "\ndef"
+        self.assertGreater(len(parts), 1)
+        self.assertEqual("".join(parts), "abc\ndef")
+
+    def test_multibyte_character_split_across_windows(self):
+        text = "abc\u00e9d\u20acf"  # 2- and 3-byte characters straddle the 4-byte windows
+        parts = self.read(text.encode("utf-8"), 4)
+        self.assertGreater(len(parts), 1)
+        self.assertEqual("".join(parts), text)
+
+
+@unittest.skipIf(_extract_docx_text is None, "loader dependencies not installed")
+class TestDocxExtraction(unittest.TestCase):
+
+    def test_tabs_and_breaks_are_kept(self):
+        import os, zipfile
+        body = (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            '<w:body><w:p><w:pPr><w:tabs><w:tab w:val="left" w:pos="720"/></w:tabs></w:pPr>'
+            '<w:r><w:t>Name:</w:t><w:tab/><w:t>Akansha</w:t><w:br/><w:t>Line2</w:t></w:r></w:p>'
+            '<w:p/><w:p><w:r><w:t>Next</w:t><w:br w:type="page"/></w:r></w:p></w:body></w:document>'
+        )
+        path = os.path.join(tempfile.mkdtemp(), "note.docx")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr("word/document.xml", body)
+        self.assertEqual(_extract_docx_text(path), "Name:\tAkansha\nLine2\nNext")
+
+    def test_textbox_is_read_once_and_kept_out_of_its_paragraph(self):
+        import os, zipfile
+        box = '<w:txbxContent><w:p><w:r><w:t>Box text</w:t></w:r></w:p></w:txbxContent>'
+        body = (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+            ' xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006">'
+            '<w:body><w:p><w:r><w:t>Before</w:t></w:r><w:r><mc:AlternateContent>'
+            f'<mc:Choice Requires="wps"><w:drawing>{box}</w:drawing></mc:Choice>'
+            f'<mc:Fallback><w:pict>{box}</w:pict></mc:Fallback>'
+            '</mc:AlternateContent></w:r><w:r><w:t>After</w:t></w:r></w:p></w:body></w:document>'
+        )
+        path = os.path.join(tempfile.mkdtemp(), "resume.docx")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr("word/document.xml", body)
+        self.assertEqual(_extract_docx_text(path), "BeforeAfter\nBox text")
+
+
 if __name__ == "__main__":
     unittest.main()